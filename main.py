@@ -1,12 +1,39 @@
 import asyncio
 import os
-import json
 import logging
-from datetime import datetime, time
+import random
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+from datetime import datetime, time, timedelta
+from time import monotonic
+from types import MappingProxyType
+from typing import NamedTuple
+try:
+    import orjson
+except ImportError:
+    # Fall back to the stdlib with the same bytes-based API
+    import json
+    from types import SimpleNamespace
+    orjson = SimpleNamespace(
+        loads=json.loads,
+        dumps=lambda obj: json.dumps(obj).encode(),
+        JSONDecodeError=json.JSONDecodeError,
+    )
+try:
+    import uvloop
+except ImportError:
+    # Not available on Windows; stay on the default asyncio loop
+    uvloop = None
+import aiohttp
+import aiosqlite
+import httpx
 from dotenv import load_dotenv
+from gql import Client, gql
+from gql.transport.aiohttp import AIOHTTPTransport
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
-from telegram.error import Forbidden
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+from telegram.helpers import escape_markdown
 from telegram.request import HTTPXRequest
 from ostium_python_sdk import OstiumSDK, NetworkConfig
 
@@ -18,7 +45,11 @@ TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 RPC_URL = os.getenv('RPC_URL')
 PRIVATE_KEY = os.getenv('PRIVATE_KEY')
 TARGET_WALLET = "0x7c930969fcf3e5a5c78bcf2e1cefda3f53e3c8fd"
+SUBSCRIBERS_DB = "subscribers.db"
+# Legacy JSON subscriber list, imported into SUBSCRIBERS_DB on first start
 SUBSCRIBERS_FILE = "subscribers.json"
+# Ormi subgraph endpoint, used instead of the SDK's default graph URL
+GRAPH_URL = "https://api.subgraph.ormilabs.com/api/public/67a599d5-c8d2-4cc4-9c4d-2975a97bc5d8/subgraphs/ost-prod/live/gn"
 # Telegram Group Chat ID (the negative number from the group)
 TELEGRAM_GROUP_CHAT_ID = os.getenv('TELEGRAM_GROUP_CHAT_ID')
 if TELEGRAM_GROUP_CHAT_ID:
@@ -29,6 +60,29 @@ if MESSAGE_THREAD_ID:
     MESSAGE_THREAD_ID = int(MESSAGE_THREAD_ID)
 # Daily report time (format: HH:MM in 24h format, default 09:00)
 DAILY_REPORT_TIME = os.getenv('DAILY_REPORT_TIME', '09:00')
+# Longest single sleep before re-checking the wall clock for the daily report
+REPORT_RECHECK_SECONDS = 300
+# Consecutive polls a trade must be missing before it is reported as closed
+CLOSE_CONFIRM_CYCLES = 2
+# Telegram HTTP connection pool size
+TELEGRAM_POOL_SIZE = 32
+# Max concurrent broadcast sends, kept under Telegram's ~30 msg/s global limit
+# (and below the pool size, leaving room for command replies)
+BROADCAST_CONCURRENCY = 25
+# Broadcasts waiting for the Telegram worker; new ones are dropped when full
+TELEGRAM_QUEUE_SIZE = 500
+# Attempts per Telegram send on flood control and connection errors
+SEND_ATTEMPTS = 3
+# Circuit breaker: after this many consecutive deliveries lost to network errors
+# the worker stops sending and probes Telegram with a cheap getMe instead
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 60  # seconds between probes while the breaker is open
+BREAKER_PROBE_TIMEOUT = 10  # connect/read timeout of a probe (seconds)
+# Adaptive polling: snap to a short interval after trade activity, back off while idle
+POLL_INTERVAL = 60         # Wait between the initial snapshot and the first diff (seconds)
+POLL_INTERVAL_ACTIVE = 15  # Interval right after a detected change
+POLL_INTERVAL_MAX = 120    # Idle cycles double the interval up to this: 30, 60, 120
+POLL_IDLE_DOUBLINGS = 3
 
 # Logging setup
 logging.basicConfig(
@@ -46,21 +100,59 @@ if not all([TELEGRAM_BOT_TOKEN, RPC_URL, PRIVATE_KEY, TELEGRAM_GROUP_CHAT_ID, ME
     exit(1)
 
 # --- Persistence ---
-def load_subscribers():
-    if os.path.exists(SUBSCRIBERS_FILE):
-        try:
-            with open(SUBSCRIBERS_FILE, 'r') as f:
-                return set(json.load(f))
-        except json.JSONDecodeError:
-            return set()
-    return set()
+def load_legacy_subscribers():
+    """Reads chat ids from the old subscribers.json file.
 
-def save_subscribers(subscribers):
-    with open(SUBSCRIBERS_FILE, 'w') as f:
-        json.dump(list(subscribers), f)
+    Returns None when there is no file or it can't be parsed, so an
+    unreadable file is left in place instead of being retired as empty.
+    """
+    if not os.path.exists(SUBSCRIBERS_FILE):
+        return None
+    try:
+        with open(SUBSCRIBERS_FILE, 'rb') as f:
+            return set(orjson.loads(f.read()))
+    except (OSError, orjson.JSONDecodeError, TypeError) as e:
+        logger.error("Could not read %s, leaving it untouched: %s", SUBSCRIBERS_FILE, e)
+        return None
+
+# Global set of subscribers: in-memory mirror of the `subs` table
+subscribers = set()
+_subs_db = None
+
+async def init_subscribers_db():
+    """Opens the subscriber database (WAL mode) and loads it into `subscribers`."""
+    global _subs_db
+    _subs_db = await aiosqlite.connect(SUBSCRIBERS_DB)
+    await _subs_db.execute("PRAGMA journal_mode=WAL")
+    await _subs_db.execute("PRAGMA synchronous=NORMAL")
+    await _subs_db.execute("CREATE TABLE IF NOT EXISTS subs(chat_id INTEGER PRIMARY KEY)")
+
+    async with _subs_db.execute("SELECT chat_id FROM subs") as cursor:
+        subscribers.update(row[0] for row in await cursor.fetchall())
+
+    # One-time import of the old JSON subscriber list
+    legacy = load_legacy_subscribers()
+    if legacy is not None:
+        await _subs_db.executemany("INSERT OR IGNORE INTO subs(chat_id) VALUES (?)", [(c,) for c in legacy])
+        await _subs_db.commit()
+        subscribers.update(legacy)
+        # Retire the file only after the rows are durably in the database
+        os.replace(SUBSCRIBERS_FILE, SUBSCRIBERS_FILE + ".migrated")
+        logger.info("Imported %d subscribers from %s", len(legacy), SUBSCRIBERS_FILE)
+    else:
+        await _subs_db.commit()
 
-# Global set of subscribers
-subscribers = load_subscribers()
+async def add_subscriber(chat_id):
+    """Subscribes a chat: one INSERT instead of rewriting the whole list."""
+    subscribers.add(chat_id)
+    await _subs_db.execute("INSERT OR IGNORE INTO subs(chat_id) VALUES (?)", (chat_id,))
+    await _subs_db.commit()
+
+async def remove_subscribers(chat_ids):
+    """Unsubscribes one or more chats in a single transaction."""
+    subscribers.difference_update(chat_ids)
+    await _subs_db.executemany("DELETE FROM subs WHERE chat_id = ?", [(c,) for c in chat_ids])
+    await _subs_db.commit()
 
 # --- Fee Structure (in basis points - bps) ---
 # Based on Ostium's fee schedule
@@ -81,15 +173,15 @@ OPENING_FEES = {
     '_STOCKS_': 5,   # Taker fee for stocks
 }
 
+# Default to crypto rate (most common, highest fee)
+_CRYPTO_RATE = OPENING_FEES['_CRYPTO_']
+
+@lru_cache(maxsize=512)
 def get_opening_fee_bps(pair_symbol):
     """Returns the opening fee in basis points for a given pair."""
-    # Check if specific pair has a fee
-    if pair_symbol in OPENING_FEES:
-        return OPENING_FEES[pair_symbol]
-
-    # Default to crypto rate (most common, highest fee)
+    # Specific pair fee, otherwise the crypto default
     # In production, you'd classify the pair by asset class
-    return OPENING_FEES['_CRYPTO_']
+    return OPENING_FEES.get(pair_symbol, _CRYPTO_RATE)
 
 def calculate_opening_fee(notional_usdc, pair_symbol):
     """Calculate opening fee in USDC based on notional value and pair."""
@@ -99,226 +191,510 @@ def calculate_opening_fee(notional_usdc, pair_symbol):
     return fee_usdc
 
 # --- Ostium Helper ---
-async def get_current_trades_dict(sdk, retries=5):
-    """Fetches open trades and returns a dict keyed by unique ID."""
+# Network config is built once at import and reused for any SDK construction
+_NET_CFG = NetworkConfig.mainnet()
+# Override the subgraph URL with the new Ormi endpoint
+_NET_CFG.graph_url = GRAPH_URL
+
+def build_sdk():
+    """Creates the Ostium SDK instance shared by handlers and background tasks."""
+    return OstiumSDK(_NET_CFG, PRIVATE_KEY, RPC_URL)
+
+class PersistentAIOHTTPTransport(AIOHTTPTransport):
+    """gql transport that keeps one aiohttp session (and its connection pool) open.
+
+    gql connects and closes the transport around every query; here that only
+    happens once, so subgraph calls reuse warm keep-alive connections.
+    """
+
+    async def connect(self):
+        if self.session is None:
+            await super().connect()
+
+    async def close(self):
+        pass  # Keep the session for the next query; see shutdown()
+
+    async def shutdown(self):
+        """Really closes the session and its connector."""
+        await super().close()
+
+class OrjsonClientResponse(aiohttp.ClientResponse):
+    """aiohttp response whose json() parses the raw body bytes with orjson."""
+
+    async def json(self, *, content_type=None, **kwargs):
+        if content_type or kwargs:
+            # Callers asking for mimetype checks or a custom decoder get aiohttp's path
+            return await super().json(content_type=content_type, **kwargs)
+        body = await self.read()
+        return orjson.loads(body) if body.strip() else None
+
+def attach_persistent_transport(sdk):
+    """Points the SDK's subgraph client at a pooled, long-lived aiohttp transport."""
+    transport = PersistentAIOHTTPTransport(
+        url=sdk.subgraph.url,
+        # orjson both ways: aiohttp wants str bodies, responses are parsed from bytes
+        json_serialize=lambda obj: orjson.dumps(obj).decode(),
+        client_session_args={
+            'connector': aiohttp.TCPConnector(limit=20, ttl_dns_cache=300),
+            'response_class': OrjsonClientResponse,
+        },
+    )
+    # Same client settings the SDK would use for its own lazily-built client
+    sdk.subgraph._client = Client(
+        transport=transport,
+        fetch_schema_from_transport=False,
+        execute_timeout=None
+    )
+    return transport
+
+class TradeView(NamedTuple):
+    """Typed snapshot of an open trade, parsed once from the subgraph dict."""
+    collateral_raw: int
+    notional_raw: int
+    open_price_raw: int
+    leverage_raw: int
+    is_buy: bool
+    pair_id: str
+    pair_sym: str
+    raw: dict
+
+    @property
+    def sig(self):
+        """Raw fields compared between cycles to spot a modified position."""
+        return (self.collateral_raw, self.notional_raw, self.leverage_raw)
+
+def _raw_int(value):
+    """Parses a raw subgraph amount (an integer string) into an int; missing values are 0."""
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return int(float(value))
+
+# Shared read-only default for missing nested subgraph objects (no {} per lookup)
+_EMPTY = MappingProxyType({})
+
+def _view(trade) -> TradeView:
+    """Converts a raw subgraph trade dict into a TradeView."""
+    pair = trade.get('pair') or _EMPTY
+    return TradeView(
+        collateral_raw=_raw_int(trade.get('collateral')),
+        notional_raw=_raw_int(trade.get('notional')),
+        open_price_raw=_raw_int(trade.get('openPrice')),
+        leverage_raw=_raw_int(trade.get('leverage')),
+        is_buy=trade.get('isBuy', True),  # 'isBuy' from raw data
+        pair_id=pair.get('id'),
+        pair_sym=f"{pair.get('from', 'Unknown')}/{pair.get('to', 'USD')}",
+        raw=trade,
+    )
+
+# Open trades plus the latest executed orders in a single subgraph round-trip.
+# Only the fields the bot reads are selected.
+_STATE_QUERY = gql("""
+query state($trader: Bytes!, $last_n_orders: Int) {
+  trades(where: { isOpen: true, trader: $trader }) {
+    index
+    collateral
+    leverage
+    openPrice
+    isBuy
+    notional
+    pair { id from to }
+  }
+  orders(
+    where: { trader: $trader, isPending: false }
+    first: $last_n_orders
+    orderBy: executedAt
+    orderDirection: desc
+  ) {
+    id
+    orderAction
+    collateral
+    price
+    amountSentToTrader
+    rolloverFee
+    fundingFee
+    pair { id }
+  }
+}
+""")
+
+def _index_trades(open_trades):
+    """Keys raw subgraph trades by unique ID, a (pair_id, index) tuple, as TradeViews."""
+    current_trades = {}
+    for trade in open_trades:
+        view = _view(trade)
+        # Tuple key: no string formatting per trade, and hashing stays in C
+        current_trades[(view.pair_id, trade.get('index'))] = view
+    return current_trades
+
+# Retry delays in seconds, indexed by attempt: exponential, capped at 30s
+_BACKOFF = (1, 2, 4, 8, 16, 30)
+
+async def _fetch_with_retries(fetch, retries):
+    """Awaits `fetch()` with exponential backoff; returns None if every attempt fails."""
+    first_err = None
     for attempt in range(retries):
         try:
-            open_trades = await sdk.subgraph.get_open_trades(TARGET_WALLET)
-            current_trades = {}
-            for trade in open_trades:
-                pair_id = trade.get('pair', {}).get('id')
-                trade_index = trade.get('index')
-                unique_id = f"{pair_id}-{trade_index}"
-                current_trades[unique_id] = trade
-            return current_trades
+            return await fetch()
         except Exception as e:
-            wait_time = min(2 ** attempt, 30)  # Exponential backoff: 1s, 2s, 4s, 8s, 16s (max 30s)
-            logger.warning(f"Failed to fetch trades (attempt {attempt+1}/{retries}): {type(e).__name__}")
+            if first_err is None:
+                first_err = e
+            # Small jitter so retries after a shared outage don't all land at once
+            wait_time = _BACKOFF[min(attempt, len(_BACKOFF) - 1)] + random.uniform(0, 0.5)
+            # Intermediate attempts only at DEBUG; a single line is logged if all of them fail
+            logger.debug("Failed to fetch trades (attempt %d/%d): %s", attempt + 1, retries, type(e).__name__)
             if attempt < retries - 1:
-                logger.info(f"Retrying in {wait_time}s...")
                 await asyncio.sleep(wait_time)
             else:
-                logger.error(f"All {retries} attempts failed. Subgraph may be down: {e}")
+                logger.error("Subgraph failed after %d attempts (%s): %s", retries, type(first_err).__name__, first_err)
                 return None  # Return None to indicate failure, not empty dict
 
-def format_trade_message(trade, status="OPEN", close_details=None):
-    """Formats a trade dict into a readable string."""
-    try:
-        # Extract Pair
-        pair_from = trade.get('pair', {}).get('from', 'Unknown')
-        pair_to = trade.get('pair', {}).get('to', 'USD')
-        pair_symbol = f"{pair_from}/{pair_to}"
-
-        # Extract and Scale Values
-        # USDC has 6 decimals
-        collateral_raw = float(trade.get('collateral', 0))
-        collateral_val = collateral_raw / 1e6
-        
-        notional_raw = float(trade.get('notional', 0))
-        size_val = notional_raw / 1e6
-
-        # Price usually has 18 decimals
-        open_price_raw = float(trade.get('openPrice', 0))
-        open_price_val = open_price_raw / 1e18
+async def get_current_trades_dict(sdk, retries=5):
+    """Fetches open trades and returns a dict of TradeView keyed by unique ID."""
+    async def fetch():
+        return _index_trades(await sdk.subgraph.get_open_trades(TARGET_WALLET))
+    return await _fetch_with_retries(fetch, retries)
+
+async def fetch_state(sdk, retries=5, last_n_orders=20):
+    """Fetches open trades and recent order history in one query.
+
+    Returns (trades_dict, history) with history oldest first, like
+    get_recent_history(), or None if the subgraph is unavailable.
+    """
+    async def fetch():
+        result = await sdk.subgraph._execute_query(
+            _STATE_QUERY,
+            variable_values={"trader": TARGET_WALLET, "last_n_orders": last_n_orders}
+        )
+        return _index_trades(result['trades']), list(reversed(result['orders']))
+    return await _fetch_with_retries(fetch, retries)
+
+# Latest open-trades snapshot, shared by the poller and the Telegram handlers
+TRADES_CACHE_TTL = 60  # seconds a snapshot is served as fresh
+TRADES_CACHE_STALE = 60  # further seconds it is served stale while a refresh runs
+_trades_cache = {"ts": 0.0, "data": None, "refresh": None}
+
+def update_trades_cache(trades):
+    """Stores a freshly fetched open-trades dict as the shared snapshot."""
+    _trades_cache["ts"] = monotonic()
+    _trades_cache["data"] = trades
+
+async def _refresh_trades_cache(sdk):
+    """Fetches open trades into the shared snapshot; returns None on failure."""
+    trades = await get_current_trades_dict(sdk)
+    if trades is not None:
+        update_trades_cache(trades)
+    return trades
+
+async def get_current_trades_cached(sdk, ttl=TRADES_CACHE_TTL, stale=TRADES_CACHE_STALE):
+    """Returns the shared open-trades snapshot with stale-while-revalidate semantics.
+
+    Younger than `ttl`: returned as is. Up to `stale` seconds older: returned
+    at once while a single background refresh updates it. Older: a fresh
+    fetch is awaited, falling back to the stale snapshot (or None) on failure.
+    """
+    data = _trades_cache["data"]
+    age = monotonic() - _trades_cache["ts"]
+    if data is not None and age < ttl:
+        return data
+
+    refresh = _trades_cache["refresh"]
+    if refresh is None or refresh.done():
+        refresh = _trades_cache["refresh"] = asyncio.create_task(_refresh_trades_cache(sdk))
+    if data is not None and age < ttl + stale:
+        return data
+
+    # Too old to serve: wait for the (possibly already running) refresh
+    trades = await asyncio.shield(refresh)
+    return trades if trades is not None else _trades_cache["data"]
+
+# --- Message Templates ---
+# Static message text lives here once; only the values are filled in per call
+# The wallet never changes, so its footer line is baked into the templates
+_WALLET_SUFFIX = f"\n**Wallet:** `{TARGET_WALLET}`"
+
+_OPEN_TPL = (
+    "{header}\n"
+    "**Pair:** {pair}\n"
+    "**Direction:** {direction}\n"
+    "**Entry Price:** {entry:,.2f}\n"
+    "**Size:** {size:,.2f} USDC\n"
+    "**Collateral:** {collateral:,.2f} USDC\n"
+    "**Leverage:** {leverage:.2f}x\n"
+    "**Opening Fee:** {fee:,.2f} USDC"
+    + _WALLET_SUFFIX
+)
 
-        # Leverage: 2500 likely means 25.00x (2 decimals)
-        leverage_raw = float(trade.get('leverage', 0))
-        leverage_val = leverage_raw # Display raw first, user can correct if it looks wrong. 
-        # Actually, if collateral is 160k and size is 4M, leverage = 4M / 160k = 25.
-        # So 2500 raw = 25x. Thus we divide by 100.
-        leverage_val = leverage_raw / 100
+_CLOSED_TPL = (
+    "{title}\n"
+    "**Pair:** {pair}\n"
+    "**Direction:** {direction}\n"
+    "**Entry Price:** {entry:,.2f}\n"
+    "**Size:** {size:,.2f} USDC\n"
+    "**Collateral:** {collateral:,.2f} USDC\n"
+    "**Leverage:** {leverage:.2f}x"
+    + _WALLET_SUFFIX
+)
 
-        is_long = trade.get('isBuy', True) # 'isBuy' from raw data
-        direction_str = "LONG 🟢" if is_long else "SHORT 🔴"
+_CLOSE_INFO_TPL = (
+    "\n**Close Price:** {close_price:,.2f}\n"
+    "**Opening Fee:** {fee:,.2f} USDC\n"
+)
+_FUNDING_TPL = "**Funding Paid:** {funding:,.2f} USDC\n"
+_PNL_TPL = "**PnL:** {emoji} {sign}{pnl:,.2f} USDC"
+
+_REPORT_HEADER_TPL = (
+    "📊 **DAILY ACCOUNT REPORT** 📊\n"
+    "━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    "{emoji} **Total Unrealized PNL:** {sign}{pnl:,.2f} USDC\n"
+    "💼 **Total Position Value:** {value:,.2f} USDC\n"
+    "📍 **Open Positions:** {count}\n"
+)
+_REPORT_POSITION_TPL = (
+    "{idx}️⃣ **{pair}** {direction} {direction_emoji} "
+    "{leverage:.0f}x - "
+    "Size: {size:,.2f} USDC"
+)
+_REPORT_PNL_TPL = " - PNL: {emoji} {sign}{pnl:,.2f} USDC"
+_REPORT_FOOTER_TPL = (
+    "\n━━━━━━━━━━━━━━━━━━━━━━"
+    + _WALLET_SUFFIX
+)
 
+# Scaled trade values, keyed by the typed fields they are derived from
+_TRADE_VIEW_CACHE_SIZE = 256
+_trade_view_cache = OrderedDict()
+
+def _get_scaled_view(trade: TradeView):
+    """Returns the scaled display values of a trade, computing them once per raw state."""
+    key = trade[:-1]  # Every field except the raw dict
+    view = _trade_view_cache.get(key)
+    if view is not None:
+        _trade_view_cache.move_to_end(key)
+        return view
+
+    # USDC has 6 decimals
+    size_val = trade.notional_raw / 1e6
+
+    view = {
+        # Escaped once here, so subgraph names can't break the Markdown of every message
+        'pair_symbol': escape_markdown(trade.pair_sym),
+        'collateral_val': trade.collateral_raw / 1e6,
+        'size_val': size_val,
+        # Price usually has 18 decimals
+        'open_price_val': trade.open_price_raw / 1e18,
+        # Leverage: if collateral is 160k and size is 4M, leverage = 4M / 160k = 25.
+        # So 2500 raw = 25x. Thus we divide by 100.
+        'leverage_val': trade.leverage_raw / 100,
+        'is_long': trade.is_buy,
         # Calculate opening fee based on Ostium's fee structure
-        opening_fee = calculate_opening_fee(size_val, pair_symbol)
-
-        if status == "OPEN":
-            msg = (
-                f"🟢 **OPEN POSITION**\n"
-                f"**Pair:** {pair_symbol}\n"
-                f"**Direction:** {direction_str}\n"
-                f"**Entry Price:** {open_price_val:,.2f}\n"
-                f"**Size:** {size_val:,.2f} USDC\n"
-                f"**Collateral:** {collateral_val:,.2f} USDC\n"
-                f"**Leverage:** {leverage_val:.2f}x\n"
-                f"**Opening Fee:** {opening_fee:,.2f} USDC\n"
-                f"**Wallet:** `{TARGET_WALLET}`"
+        'opening_fee': calculate_opening_fee(size_val, trade.pair_sym),
+        # Formatted open-position messages, keyed by header line
+        'open_msgs': {},
+    }
+    _trade_view_cache[key] = view
+    if len(_trade_view_cache) > _TRADE_VIEW_CACHE_SIZE:
+        _trade_view_cache.popitem(last=False)
+    return view
+
+def invalidate_trade_view(trade: TradeView):
+    """Drops the cached view (and formatted messages) of a trade whose state is being replaced."""
+    _trade_view_cache.pop(trade[:-1], None)
+
+def _format_open(trade: TradeView, header="🟢 **OPEN POSITION**"):
+    """Formats an open trade into a readable string, under the given header line."""
+    try:
+        view = _get_scaled_view(trade)
+        # Unchanged trades reuse the message formatted on a previous call
+        msg = view['open_msgs'].get(header)
+        if msg is None:
+            msg = view['open_msgs'][header] = _OPEN_TPL.format(
+                header=header,
+                pair=view['pair_symbol'],
+                direction="LONG 🟢" if view['is_long'] else "SHORT 🔴",
+                entry=view['open_price_val'],
+                size=view['size_val'],
+                collateral=view['collateral_val'],
+                leverage=view['leverage_val'],
+                fee=view['opening_fee'],
             )
-            return msg
-        elif status == "CLOSED":
-            # Check if this is a liquidation (no close details or no price)
-            is_liquidation = False
-            if not close_details:
-                is_liquidation = True
-            else:
-                try:
-                    close_price = float(close_details.get('price', 0))
-                    if close_price == 0:
-                        is_liquidation = True
-                except:
+        return msg
+    except Exception as e:
+        logger.error("Error formatting trade: %s", e)
+        return f"Error formatting trade: {str(e)}"
+
+def _format_closed(trade: TradeView, close_details=None):
+    """Formats a closed (or liquidated) trade, with PnL when close details are known."""
+    try:
+        view = _get_scaled_view(trade)
+
+        # Check if this is a liquidation (no close details or no price)
+        is_liquidation = False
+        if not close_details:
+            is_liquidation = True
+        else:
+            try:
+                close_price = _raw_int(close_details.get('price'))
+                if close_price == 0:
                     is_liquidation = True
+            except:
+                is_liquidation = True
 
-            # Set title based on liquidation status
-            title = "💀 **LIQUIDATED** 💀" if is_liquidation else "❌ **TRADE CLOSED** ❌"
-
-            base_msg = (
-                f"{title}\n"
-                f"**Pair:** {pair_symbol}\n"
-                f"**Direction:** {direction_str}\n"
-                f"**Entry Price:** {open_price_val:,.2f}\n"
-                f"**Size:** {size_val:,.2f} USDC\n"
-                f"**Collateral:** {collateral_val:,.2f} USDC\n"
-                f"**Leverage:** {leverage_val:.2f}x\n"
-                f"**Wallet:** `{TARGET_WALLET}`"
-            )
+        # Set title based on liquidation status
+        title = "💀 **LIQUIDATED** 💀" if is_liquidation else "❌ **TRADE CLOSED** ❌"
+
+        base_msg = _CLOSED_TPL.format(
+            title=title,
+            pair=view['pair_symbol'],
+            direction="LONG 🟢" if view['is_long'] else "SHORT 🔴",
+            entry=view['open_price_val'],
+            size=view['size_val'],
+            collateral=view['collateral_val'],
+            leverage=view['leverage_val'],
+        )
 
-            # Add close details only if not liquidated
-            if close_details and not is_liquidation:
-                try:
-                    close_price_val = float(close_details.get('price', 0)) / 1e18
+        # Add close details only if not liquidated
+        if close_details and not is_liquidation:
+            try:
+                close_price_val = _raw_int(close_details.get('price')) / 1e18
 
-                    # PnL Calculation: Amount Sent - Collateral
-                    amt_sent = float(close_details.get('amountSentToTrader', 0))
-                    hist_collateral = float(close_details.get('collateral', 0))
+                # PnL Calculation: Amount Sent - Collateral
+                amt_sent = _raw_int(close_details.get('amountSentToTrader'))
+                hist_collateral = _raw_int(close_details.get('collateral'))
 
-                    pnl_val = (amt_sent - hist_collateral) / 1e6
-                    pnl_sign = "+" if pnl_val >= 0 else ""
-                    pnl_emoji = "✅" if pnl_val >= 0 else "❌"
+                pnl_val = (amt_sent - hist_collateral) / 1e6
+                pnl_sign = "+" if pnl_val >= 0 else ""
+                pnl_emoji = "✅" if pnl_val >= 0 else "❌"
 
-                    # Extract funding fees (rollover + funding) from close details
-                    # These are in wei (18 decimals)
-                    rollover_fee = float(close_details.get('rolloverFee', 0)) / 1e18
-                    funding_fee = float(close_details.get('fundingFee', 0)) / 1e18
-                    total_funding = rollover_fee + funding_fee
+                # Extract funding fees (rollover + funding) from close details
+                # These are in wei (18 decimals)
+                rollover_fee = _raw_int(close_details.get('rolloverFee')) / 1e18
+                funding_fee = _raw_int(close_details.get('fundingFee')) / 1e18
+                total_funding = rollover_fee + funding_fee
 
-                    additional_info = f"\n**Close Price:** {close_price_val:,.2f}\n"
-                    additional_info += f"**Opening Fee:** {opening_fee:,.2f} USDC\n"
+                additional_info = _CLOSE_INFO_TPL.format(close_price=close_price_val, fee=view['opening_fee'])
 
-                    # Show funding fees if significant (> $0.01)
-                    if total_funding > 0.01:
-                        additional_info += f"**Funding Paid:** {total_funding:,.2f} USDC\n"
+                # Show funding fees if significant (> $0.01)
+                if total_funding > 0.01:
+                    additional_info += _FUNDING_TPL.format(funding=total_funding)
 
-                    additional_info += f"**PnL:** {pnl_emoji} {pnl_sign}{pnl_val:,.2f} USDC"
+                additional_info += _PNL_TPL.format(emoji=pnl_emoji, sign=pnl_sign, pnl=pnl_val)
 
-                    return base_msg + additional_info
-                except Exception as e:
-                    logger.error(f"Error formatting close details: {e}")
+                return base_msg + additional_info
+            except Exception as e:
+                logger.error("Error formatting close details: %s", e)
 
-            return base_msg
-            
-        return ""
+        return base_msg
     except Exception as e:
-        logger.error(f"Error formatting trade: {e}")
+        logger.error("Error formatting trade: %s", e)
         return f"Error formatting trade: {str(e)}"
 
 # --- Telegram Handlers ---
+# Budget per reply: under Telegram's 4096-char limit, with headroom because
+# emoji count double there (UTF-16)
+_REPLY_CHUNK_CHARS = 3900
+
+async def _reply_positions(update: Update, trades):
+    """Replies with the open positions packed into as few messages as possible."""
+    buf = f"📊 **Current Open Positions ({len(trades)}):**"
+    chunks = []
+    for trade in trades.values():
+        msg = _format_open(trade)
+        if len(buf) + 2 + len(msg) <= _REPLY_CHUNK_CHARS:
+            buf += "\n\n" + msg
+        else:
+            chunks.append(buf)
+            buf = msg
+    chunks.append(buf)
+
+    # Sent in order: a split list must not arrive shuffled
+    for chunk in chunks:
+        await update.message.reply_text(chunk, parse_mode='Markdown')
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Subscribe user to notifications and show current status."""
     chat_id = update.effective_chat.id
 
     # 1. Subscribe
     if chat_id not in subscribers:
-        subscribers.add(chat_id)
-        save_subscribers(subscribers)
+        await add_subscriber(chat_id)
         await update.message.reply_text(f"✅ You are now subscribed to Ostium trade alerts for wallet `{TARGET_WALLET}`!", parse_mode='Markdown')
-        logger.info(f"New subscriber: {chat_id}")
+        logger.info("New subscriber: %s", chat_id)
     else:
         await update.message.reply_text("You are already subscribed. Checking for open positions...", parse_mode='Markdown')
 
     # 2. Show current positions
     try:
-        config = NetworkConfig.mainnet()
-        config.graph_url = "https://api.subgraph.ormilabs.com/api/public/67a599d5-c8d2-4cc4-9c4d-2975a97bc5d8/subgraphs/ost-prod/live/gn"
-        sdk = OstiumSDK(config, PRIVATE_KEY, RPC_URL)
-        trades = await get_current_trades_dict(sdk)
+        sdk = context.application.bot_data['sdk']
+        trades = await get_current_trades_cached(sdk)
 
         if trades is None:
             await update.message.reply_text("⚠️ Could not fetch current positions at this moment. Will notify you of future trades.")
         elif not trades:
             await update.message.reply_text("ℹ️ No open positions found for this wallet right now.")
         else:
-            await update.message.reply_text(f"📊 **Current Open Positions ({len(trades)}):**", parse_mode='Markdown')
-            for uid, trade in trades.items():
-                msg = format_trade_message(trade, status="OPEN")
-                await update.message.reply_text(msg, parse_mode='Markdown')
+            await _reply_positions(update, trades)
 
     except Exception as e:
-        logger.error(f"Error fetching initial status for {chat_id}: {e}")
+        logger.error("Error fetching initial status for %s: %s", chat_id, e)
         await update.message.reply_text("⚠️ Could not fetch current positions at this moment.")
 
 async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Unsubscribe user from notifications."""
     chat_id = update.effective_chat.id
     if chat_id in subscribers:
-        subscribers.remove(chat_id)
-        save_subscribers(subscribers)
+        await remove_subscribers([chat_id])
         await update.message.reply_text("❌ You have unsubscribed from alerts.")
-        logger.info(f"Subscriber removed: {chat_id}")
+        logger.info("Subscriber removed: %s", chat_id)
     else:
         await update.message.reply_text("You are not subscribed.")
 
 async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show current open positions (command for manual check)."""
     try:
-        config = NetworkConfig.mainnet()
-        config.graph_url = "https://api.subgraph.ormilabs.com/api/public/67a599d5-c8d2-4cc4-9c4d-2975a97bc5d8/subgraphs/ost-prod/live/gn"
-        sdk = OstiumSDK(config, PRIVATE_KEY, RPC_URL)
-        trades = await get_current_trades_dict(sdk)
+        sdk = context.application.bot_data['sdk']
+        trades = await get_current_trades_cached(sdk)
 
         if trades is None:
             await update.message.reply_text("⚠️ Could not fetch positions.", parse_mode='Markdown')
         elif not trades:
             await update.message.reply_text("ℹ️ No open positions.", parse_mode='Markdown')
         else:
-            await update.message.reply_text(f"📊 **Current Open Positions ({len(trades)}):**", parse_mode='Markdown')
-            for uid, trade in trades.items():
-                msg = format_trade_message(trade, status="OPEN")
-                await update.message.reply_text(msg, parse_mode='Markdown')
+            await _reply_positions(update, trades)
     except Exception as e:
-        logger.error(f"Error fetching status: {e}")
+        logger.error("Error fetching status: %s", e)
         await update.message.reply_text("⚠️ Error fetching positions.", parse_mode='Markdown')
 
+# Short-lived price cache: pair_id -> (price, expires_at)
+PRICE_CACHE_TTL = 30  # seconds
+_price_cache = {}
+
 async def get_current_price(sdk, pair_id):
     """Gets current market price for a pair."""
+    now = monotonic()
+    hit = _price_cache.get(pair_id)
+    if hit and hit[1] > now:
+        return hit[0]
+
     try:
         # Get pair details which should include current price
         pair_details = await sdk.subgraph.get_pair_details(pair_id)
         # The price might be in different fields, we'll try common ones
         # For now return None, will need to check actual structure
-        return None
+        price = None
+        _price_cache[pair_id] = (price, now + PRICE_CACHE_TTL)
+        return price
     except Exception as e:
-        logger.error(f"Error getting current price for pair {pair_id}: {e}")
+        logger.error("Error getting current price for pair %s: %s", pair_id, e)
         return None
 
 async def calculate_unrealized_pnl(trade, current_price):
     """Calculate unrealized PNL for a single trade."""
     try:
         is_long = trade.get('isBuy', True)
-        open_price = float(trade.get('openPrice', 0)) / 1e18
-        notional = float(trade.get('notional', 0)) / 1e6
-        collateral = float(trade.get('collateral', 0)) / 1e6
+        open_price = _raw_int(trade.get('openPrice')) / 1e18
+        notional = _raw_int(trade.get('notional')) / 1e6
+        collateral = _raw_int(trade.get('collateral')) / 1e6
 
         if not current_price or open_price == 0:
             return 0.0
@@ -331,7 +707,7 @@ async def calculate_unrealized_pnl(trade, current_price):
 
         return pnl
     except Exception as e:
-        logger.error(f"Error calculating unrealized PNL: {e}")
+        logger.error("Error calculating unrealized PNL: %s", e)
         return 0.0
 
 async def get_account_stats(sdk):
@@ -340,34 +716,29 @@ async def get_account_stats(sdk):
         # Get open trades
         open_trades = await sdk.subgraph.get_open_trades(TARGET_WALLET)
 
-        # Calculate unrealized PNL and total position value
-        unrealized_pnl = 0.0
+        # First pass: extract trade details and collect the pairs to price
         total_position_value = 0.0
         positions_details = []
+        priced = []  # (position index, pair_id)
 
         for trade in open_trades:
             # Extract trade details
-            pair_from = trade.get('pair', {}).get('from', 'Unknown')
-            pair_to = trade.get('pair', {}).get('to', 'USD')
-            pair_symbol = f"{pair_from}/{pair_to}"
+            pair = trade.get('pair') or _EMPTY
+            pair_symbol = escape_markdown(f"{pair.get('from', 'Unknown')}/{pair.get('to', 'USD')}")
 
             is_long = trade.get('isBuy', True)
             direction = "LONG" if is_long else "SHORT"
             direction_emoji = "🟢" if is_long else "🔴"
 
-            leverage_raw = float(trade.get('leverage', 0))
+            leverage_raw = _raw_int(trade.get('leverage'))
             leverage = leverage_raw / 100
 
-            notional = float(trade.get('notional', 0)) / 1e6
+            notional = _raw_int(trade.get('notional')) / 1e6
             total_position_value += notional
 
-            # Try to get current price and calculate PNL
-            pair_id = trade.get('pair', {}).get('id')
-            pnl = 0.0
+            pair_id = pair.get('id')
             if pair_id:
-                current_price = await get_current_price(sdk, pair_id)
-                pnl = await calculate_unrealized_pnl(trade, current_price)
-                unrealized_pnl += pnl
+                priced.append((len(positions_details), pair_id))
 
             # Store position details
             positions_details.append({
@@ -376,9 +747,24 @@ async def get_account_stats(sdk):
                 'direction_emoji': direction_emoji,
                 'leverage': leverage,
                 'size': notional,
-                'pnl': pnl
+                'pnl': 0.0
             })
 
+        # Fetch all current prices concurrently
+        prices = await asyncio.gather(
+            *[get_current_price(sdk, pair_id) for _, pair_id in priced],
+            return_exceptions=True
+        )
+
+        # Second pass: calculate unrealized PNL with the resolved prices
+        unrealized_pnl = 0.0
+        for (idx, _), current_price in zip(priced, prices):
+            if isinstance(current_price, Exception):
+                continue
+            pnl = await calculate_unrealized_pnl(open_trades[idx], current_price)
+            positions_details[idx]['pnl'] = pnl
+            unrealized_pnl += pnl
+
         return {
             'unrealized_pnl': unrealized_pnl,
             'total_position_value': total_position_value,
@@ -386,7 +772,7 @@ async def get_account_stats(sdk):
             'positions': positions_details
         }
     except Exception as e:
-        logger.error(f"Error fetching account stats: {e}")
+        logger.error("Error fetching account stats: %s", e)
         return None
 
 def format_daily_report(stats):
@@ -399,273 +785,411 @@ def format_daily_report(stats):
     unrealized_sign = "+" if unrealized_pnl >= 0 else ""
     unrealized_emoji = "📈" if unrealized_pnl >= 0 else "📉"
 
-    report = (
-        f"📊 **DAILY ACCOUNT REPORT** 📊\n"
-        f"━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        f"{unrealized_emoji} **Total Unrealized PNL:** {unrealized_sign}{unrealized_pnl:,.2f} USDC\n"
-        f"💼 **Total Position Value:** {stats['total_position_value']:,.2f} USDC\n"
-        f"📍 **Open Positions:** {stats['open_positions']}\n"
+    report = _REPORT_HEADER_TPL.format(
+        emoji=unrealized_emoji,
+        sign=unrealized_sign,
+        pnl=unrealized_pnl,
+        value=stats['total_position_value'],
+        count=stats['open_positions'],
     )
 
     # Add individual positions if available
     positions = stats.get('positions', [])
     if positions:
-        report += f"\n**Open Positions:**\n"
+        report += "\n**Open Positions:**\n"
         for idx, pos in enumerate(positions, 1):
             pnl_sign = "+" if pos['pnl'] >= 0 else ""
             pnl_emoji = "✅" if pos['pnl'] >= 0 else "❌"
 
-            report += (
-                f"{idx}️⃣ **{pos['pair']}** {pos['direction']} {pos['direction_emoji']} "
-                f"{pos['leverage']:.0f}x - "
-                f"Size: {pos['size']:,.2f} USDC"
-            )
+            report += _REPORT_POSITION_TPL.format(idx=idx, **pos)
 
             # Show PNL if calculated (not zero)
             if abs(pos['pnl']) > 0.01:
-                report += f" - PNL: {pnl_emoji} {pnl_sign}{pos['pnl']:,.2f} USDC"
+                report += _REPORT_PNL_TPL.format(emoji=pnl_emoji, sign=pnl_sign, pnl=pos['pnl'])
 
             report += "\n"
 
-    report += (
-        f"\n━━━━━━━━━━━━━━━━━━━━━━\n"
-        f"**Wallet:** `{TARGET_WALLET}`"
-    )
+    report += _REPORT_FOOTER_TPL
 
     return report
 
+# httpx errors raised before the request reached Telegram: resending can't duplicate
+_UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+def _is_transient(err):
+    """True for transport failures (network errors, timeouts, flood control), not permanent API errors."""
+    return isinstance(err, RetryAfter) or (isinstance(err, NetworkError) and not isinstance(err, BadRequest))
+
+async def _send_one(application: Application, chat_id, text, **kwargs):
+    """Sends one Markdown message, holding a slot of the broadcast semaphore.
+
+    Flood control and errors raised before the request reached Telegram are
+    retried up to SEND_ATTEMPTS times; the last error is raised. Read/write
+    timeouts are not retried: the message may already be posted, and a resend
+    would duplicate the alert. Forbidden and BadRequest are never retried.
+    """
+    async with application.bot_data['send_sem']:
+        for attempt in range(SEND_ATTEMPTS):
+            try:
+                return await application.bot.send_message(chat_id=chat_id, text=text, parse_mode='Markdown', **kwargs)
+            except RetryAfter as e:
+                if attempt == SEND_ATTEMPTS - 1:
+                    raise
+                # Flood control hit: wait as instructed
+                delay = e.retry_after
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                logger.warning("Flood control for %s, retrying in %ss", chat_id, delay)
+            except NetworkError as e:  # Includes TimedOut and BadRequest
+                if attempt == SEND_ATTEMPTS - 1 or not isinstance(e.__cause__, _UNSENT_ERRORS):
+                    raise
+                delay = _BACKOFF[attempt]
+                logger.warning("Send to %s failed (%s), retrying in %ds", chat_id, e, delay)
+            await asyncio.sleep(delay)
+
 async def broadcast_message(application: Application, message: str):
-    """Sends a message to the configured group and all subscribed users."""
+    """Queues a message for the group and all subscribers; telegram_worker delivers it.
+
+    Never waits on Telegram, so a slow or failing API can't stall the poll loop.
+    Returns False if the queue was full and the message was dropped.
+    """
+    queue = application.bot_data['msg_queue']
+    try:
+        queue.put_nowait(message)
+        return True
+    except asyncio.QueueFull:
+        logger.warning("Broadcast queue full (%d), dropping message: %s", queue.maxsize, message.splitlines()[0])
+        return False
+
+async def telegram_worker(application: Application):
+    """Delivers queued broadcasts one at a time, in the order they were queued."""
+    queue = application.bot_data['msg_queue']
+    failures = 0  # consecutive deliveries lost to transient errors
+    while True:
+        message = await queue.get()
+        try:
+            if failures >= BREAKER_THRESHOLD:
+                # Breaker open: hold this and the queued messages until Telegram answers
+                await _wait_for_telegram(application)
+                failures = 0
+            try:
+                outage = await _deliver_broadcast(application, message)
+            except Exception as e:
+                logger.error("Failed to deliver broadcast: %s", e)
+                outage = False
+            failures = failures + 1 if outage else 0
+        finally:
+            queue.task_done()
+
+async def _wait_for_telegram(application: Application):
+    """Probes Telegram with getMe every BREAKER_COOLDOWN seconds until it answers."""
+    queue = application.bot_data['msg_queue']
+    while True:
+        logger.warning(
+            "Telegram unreachable, pausing broadcasts for %ds (%d queued)",
+            BREAKER_COOLDOWN, queue.qsize() + 1
+        )
+        await asyncio.sleep(BREAKER_COOLDOWN)
+        try:
+            await application.bot.get_me(
+                connect_timeout=BREAKER_PROBE_TIMEOUT, read_timeout=BREAKER_PROBE_TIMEOUT
+            )
+        except Exception as e:
+            if _is_transient(e):
+                continue
+        logger.info("Telegram reachable again, resuming broadcasts")
+        return
+
+async def _deliver_broadcast(application: Application, message: str):
+    """Sends a message to the configured group and all subscribed users.
+
+    Returns True when the delivery looks like a Telegram outage: at least one
+    send failed with a transient error and none succeeded. Permanent errors
+    (bot removed from the group, unparseable message, blocked users) don't count.
+    """
+    successes = transient = 0
+
     # 1. Send to group + topic
     try:
-        kwargs = {
-            "chat_id": TELEGRAM_GROUP_CHAT_ID,
-            "text": message,
-            "parse_mode": 'Markdown'
-        }
+        kwargs = {}
         if MESSAGE_THREAD_ID:
             kwargs["message_thread_id"] = MESSAGE_THREAD_ID
-
-        await application.bot.send_message(**kwargs)
+        await _send_one(application, TELEGRAM_GROUP_CHAT_ID, message, **kwargs)
+        successes += 1
     except Exception as e:
-        logger.error(f"Failed to send message to group: {e}")
+        logger.error("Failed to send message to group: %s", e)
+        transient += _is_transient(e)
+
+    # 2. Send to all subscribed private chats concurrently
+    if subscribers:
+        # Snapshot once: the live set may change while the sends are in flight
+        snapshot = frozenset(subscribers)
+        results = await asyncio.gather(
+            *[_send_one(application, chat_id, message) for chat_id in snapshot],
+            return_exceptions=True
+        )
+
+        blocked = []
+        for chat_id, result in zip(snapshot, results):
+            if isinstance(result, Forbidden):
+                # User blocked the bot
+                logger.warning("User %s blocked the bot. Removing from subscribers.", chat_id)
+                blocked.append(chat_id)
+            elif isinstance(result, Exception):
+                logger.error("Failed to send message to %s: %s", chat_id, result)
+                transient += _is_transient(result)
+            else:
+                successes += 1
 
-    # 2. Send to all subscribed private chats
-    if not subscribers:
-        return
+        if blocked:
+            await remove_subscribers(blocked)
 
-    for chat_id in list(subscribers):
-        try:
-            await application.bot.send_message(
-                chat_id=chat_id,
-                text=message,
-                parse_mode='Markdown'
-            )
-        except Forbidden:
-            # User blocked the bot
-            logger.warning(f"User {chat_id} blocked the bot. Removing from subscribers.")
-            subscribers.remove(chat_id)
-            save_subscribers(subscribers)
-        except Exception as e:
-            logger.error(f"Failed to send message to {chat_id}: {e}")
+    return transient > 0 and successes == 0
 
 # --- Daily Report Scheduler ---
-async def daily_report_scheduler(application: Application):
+async def daily_report_scheduler(application: Application, sdk):
     """Sends daily account report at configured time."""
-    logger.info(f"Starting Daily Report Scheduler (Report time: {DAILY_REPORT_TIME})...")
+    logger.info("Starting Daily Report Scheduler (Report time: %s)...", DAILY_REPORT_TIME)
 
     # Parse the configured time
     try:
         hour, minute = map(int, DAILY_REPORT_TIME.split(':'))
         target_time = time(hour, minute)
     except Exception as e:
-        logger.error(f"Invalid DAILY_REPORT_TIME format: {DAILY_REPORT_TIME}. Using default 09:00")
+        logger.error("Invalid DAILY_REPORT_TIME format: %s. Using default 09:00", DAILY_REPORT_TIME)
         target_time = time(9, 0)
 
-    # Initialize SDK for daily reports
-    try:
-        config = NetworkConfig.mainnet()
-        config.graph_url = "https://api.subgraph.ormilabs.com/api/public/67a599d5-c8d2-4cc4-9c4d-2975a97bc5d8/subgraphs/ost-prod/live/gn"
-        sdk = OstiumSDK(config, PRIVATE_KEY, RPC_URL)
-    except Exception as e:
-        logger.error(f"Error initializing SDK for daily reports: {e}")
-        return
-
-    last_report_date = None
+    # First occurrence of the report time; afterwards it advances one day at a time
+    now = datetime.now()
+    next_run = now.replace(hour=target_time.hour, minute=target_time.minute, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
 
     while True:
         try:
+            # asyncio.sleep counts elapsed seconds, which drift from the wall clock
+            # across DST changes, NTP steps or VM resumes: re-check after each
+            # nap so the report never goes out early
             now = datetime.now()
-            current_time = now.time()
-            current_date = now.date()
-
-            # Check if it's time to send the report and we haven't sent it today
-            if (current_time.hour == target_time.hour and
-                current_time.minute == target_time.minute and
-                last_report_date != current_date):
+            while now < next_run:
+                await asyncio.sleep(min((next_run - now).total_seconds(), REPORT_RECHECK_SECONDS))
+                now = datetime.now()
 
-                logger.info("Generating daily account report...")
+            # Move the target on before sending, so an error below can't resend today's report
+            # (and a long suspend doesn't replay the missed days)
+            while next_run <= now:
+                next_run += timedelta(days=1)
 
-                # Get account stats
-                stats = await get_account_stats(sdk)
+            logger.info("Generating daily account report...")
 
-                # Format and send report
-                report = format_daily_report(stats)
-                await broadcast_message(application, report)
+            # Get account stats
+            stats = await get_account_stats(sdk)
 
-                logger.info("Daily report sent successfully!")
-                last_report_date = current_date
-
-            # Sleep for 60 seconds before checking again
-            await asyncio.sleep(60)
+            # Format and send report
+            report = format_daily_report(stats)
+            if await broadcast_message(application, report):
+                logger.info("Daily report queued for delivery.")
+            else:
+                logger.warning("Daily report dropped: broadcast queue is full.")
 
         except Exception as e:
-            logger.error(f"Error in daily report scheduler: {e}")
+            logger.error("Error in daily report scheduler: %s", e)
             await asyncio.sleep(60)
 
 # --- Ostium Polling Task ---
-async def poll_ostium(application: Application):
+async def poll_ostium(application: Application, sdk):
     """Polls Ostium SDK for trade updates."""
-    logger.info(f"Starting Ostium Monitor for {TARGET_WALLET}...")
-
-    try:
-        config = NetworkConfig.mainnet()
-        # Override the subgraph URL with the new Ormi endpoint
-        config.graph_url = "https://api.subgraph.ormilabs.com/api/public/67a599d5-c8d2-4cc4-9c4d-2975a97bc5d8/subgraphs/ost-prod/live/gn"
-        sdk = OstiumSDK(config, PRIVATE_KEY, RPC_URL)
-        logger.info(f"SDK Initialized with Ormi subgraph: {config.graph_url}")
-    except Exception as e:
-        logger.error(f"Error initializing SDK: {e}")
-        return
-
-    known_trades = {}
-    first_run = True
+    logger.info("Starting Ostium Monitor for %s...", TARGET_WALLET)
+
+    # Seed the known state once before the loop, so every cycle below is a plain diff.
+    # Without a baseline every open trade would be reported as new, so keep retrying.
+    state = await fetch_state(sdk)
+    while state is None:
+        logger.warning("Subgraph unavailable. Will retry in 5 minutes.")
+        await asyncio.sleep(300)
+        state = await fetch_state(sdk)
+    initial_trades = state[0]
+    update_trades_cache(initial_trades)
+    logger.info("Initial check: Found %d open trades.", len(initial_trades))
+    # Per-trade details are only formatted when DEBUG logging is on
+    if logger.isEnabledFor(logging.DEBUG):
+        for uid, trade in initial_trades.items():
+            msg = _format_open(trade)
+            logger.debug("  - %s-%s: %s", uid[0], uid[1], msg.replace("\n", " "))  # Log as single line
+    # Shared with the trades cache: known_trades is rebound each cycle, never mutated
+    known_trades = initial_trades
+
+    missing_counts = {}  # uid -> consecutive polls the trade has been missing
+    interval = POLL_INTERVAL
+    idle_cycles = 0  # consecutive polls without a new, modified or closed trade
+    await asyncio.sleep(interval)
 
     while True:
+        # Sleep to a deadline measured from the cycle start, so slow fetches
+        # or broadcasts don't stretch the poll period
+        cycle_start = monotonic()
         try:
-            # Fetch open trades
-            current_trades = await get_current_trades_dict(sdk)
-            
+            # Fetch open trades and recent history together, so closes need no extra round-trip
+            state = await fetch_state(sdk)
+
             # Skip this cycle if fetch failed
-            if current_trades is None:
+            if state is None:
                 logger.warning("Subgraph unavailable. Will retry in 5 minutes.")
                 await asyncio.sleep(300)  # Wait 5 minutes when subgraph is down
+                # Restart the backoff: the next good poll is followed by a short interval,
+                # since trades may have changed during the outage
+                idle_cycles = 0
                 continue
-
-            if first_run:
-                logger.info(f"Initial check: Found {len(current_trades)} open trades.")
-                for uid, trade in current_trades.items():
-                    # Log details to console
-                    msg = format_trade_message(trade, status="OPEN")
-                    logger.info(f"  - {uid}: {msg.replace(chr(10), ' ')}") # Log as single line
-                
-                known_trades = current_trades
-                first_run = False
+            current_trades, history = state
+
+            # Share the fresh snapshot so /start and /status can skip the subgraph
+            update_trades_cache(current_trades)
+
+            # Diff the id spaces with set algebra on the key views
+            cur_keys = current_trades.keys()
+            known_keys = known_trades.keys()
+            new_uids = cur_keys - known_keys
+            kept_uids = cur_keys & known_keys
+
+            # Only report a close once the trade has been missing for
+            # CLOSE_CONFIRM_CYCLES polls, so a subgraph glitch doesn't emit CLOSE + NEW
+            for uid in missing_counts.keys() & cur_keys:
+                del missing_counts[uid]
+            confirmed = set()
+            for uid in known_keys - cur_keys:
+                missing_counts[uid] = missing_counts.get(uid, 0) + 1
+                if missing_counts[uid] >= CLOSE_CONFIRM_CYCLES:
+                    confirmed.add(uid)
+                    del missing_counts[uid]
+            changed = bool(new_uids or confirmed)
+
+            # Walk events in snapshot (insertion) order, not set order: close orders are
+            # matched greedily, and set order of str tuples changes with hash randomization
+            if new_uids:
+                new_uids = [uid for uid in current_trades if uid in new_uids]
+            closed_uids = [uid for uid in known_trades if uid in confirmed] if confirmed else []
+            held = {}  # known entries that must outlive this snapshot (see end of cycle)
+
+            # Check for NEW trades
+            for uid in new_uids:
+                trade = current_trades[uid]
+                msg = _format_open(trade, header="🚨 **NEW TRADE DETECTED** 🚨")
+                await broadcast_message(application, msg)
+
+            # Check for MODIFIED trades
+            for uid in kept_uids:
+                trade = current_trades[uid]
+                old_trade = known_trades[uid]
+                # Steady state: one tuple compare, nothing else to do
+                if trade.sig == old_trade.sig:
+                    continue
+                diff_raw = trade.collateral_raw - old_trade.collateral_raw
+
+                # Compare raw integer values
+                if abs(diff_raw) > 1000: # Ignore tiny dust changes (e.g. < 0.001 USDC)
+                    # Calculate diff
+                    diff_val = diff_raw / 1e6
+                    sign = "+" if diff_val > 0 else ""
+                    diff_str = f"({sign}{diff_val:,.2f} USDC)"
+
+                    # Base message with the update header
+                    final_msg = _format_open(trade, header="⚠️ **TRADE UPDATE** ⚠️")
+                    # Inject diff into collateral line
+                    # We know the line format is "**Collateral:** X,XXX.XX USDC"
+                    # We can just append it to the message for simplicity or replace
+                    final_msg += f"\n**Change:** {diff_str}"
+
+                    await broadcast_message(application, final_msg)
+                    invalidate_trade_view(old_trade)
+                    changed = True
+                else:
+                    # Dust change: keep the old baseline so small changes can add up
+                    held[uid] = old_trade
+
+            # Check for CLOSED trades
+            # Index Close orders once by (pair_id, whole-USDC collateral bucket)
+            # 1 USDC = 1,000,000 units
+            hist_index = defaultdict(list)
+            if closed_uids:
+                for item in history:
+                    if item.get('orderAction') == 'Close':
+                        hist_collateral = _raw_int(item.get('collateral'))
+                        bucket = ((item.get('pair') or _EMPTY).get('id'), hist_collateral // 1_000_000)
+                        hist_index[bucket].append((hist_collateral, item))
+            matched = set()  # id() of orders already paired with a closed trade
+
+            for uid in closed_uids:
+                trade = known_trades[uid]
+                logger.info("Trade %s-%s closed. finding details...", uid[0], uid[1])
+
+                close_details = None
+
+                # Match by Collateral (within 1 USDC tolerance): any such order
+                # sits in the trade's bucket or one of its two neighbours
+                trade_pair_id = trade.pair_id
+                trade_collateral = trade.collateral_raw
+                trade_bucket = trade_collateral // 1_000_000
+                min_diff = 1_000_000
+
+                for bucket in (trade_bucket, trade_bucket + 1, trade_bucket - 1):
+                    for hist_collateral, item in hist_index.get((trade_pair_id, bucket), ()):
+                        diff = abs(hist_collateral - trade_collateral)
+                        if diff < min_diff and id(item) not in matched:
+                            min_diff = diff
+                            close_details = item
+
+                if close_details is not None:
+                    # Mark it so it can't be matched to another trade in this batch
+                    matched.add(id(close_details))
+
+                # Format message with optional details
+                msg = _format_closed(trade, close_details)
+                await broadcast_message(application, msg)
+                invalidate_trade_view(trade)
+
+            # The fresh snapshot becomes the known state in one rebind: new and
+            # updated trades are already in it and closed ones already absent.
+            # Only trades not yet confirmed closed and dust baselines carry over.
+            if missing_counts:
+                # Carried in known_trades order, so close matching stays deterministic
+                for uid, trade in known_trades.items():
+                    if uid in missing_counts:
+                        held[uid] = trade
+            if held:
+                known_trades = {**current_trades, **held}
             else:
-                # Check for NEW and MODIFIED trades
-                for uid, trade in current_trades.items():
-                    if uid not in known_trades:
-                        # NEW TRADE
-                        msg = format_trade_message(trade, status="OPEN")
-                        msg = msg.replace("🟢 **OPEN POSITION**", "🚨 **NEW TRADE DETECTED** 🚨")
-                        await broadcast_message(application, msg)
-                        known_trades[uid] = trade
-                    else:
-                        # CHECK FOR MODIFICATIONS
-                        old_trade = known_trades[uid]
-                        old_collateral = float(old_trade.get('collateral', 0))
-                        new_collateral = float(trade.get('collateral', 0))
-                        
-                        # Compare raw values
-                        if abs(new_collateral - old_collateral) > 1000: # Ignore tiny dust changes (e.g. < 0.001 USDC)
-                            # Calculate diff
-                            diff_val = (new_collateral - old_collateral) / 1e6
-                            sign = "+" if diff_val > 0 else ""
-                            diff_str = f"({sign}{diff_val:,.2f} USDC)"
-                            
-                            # Base message
-                            base_msg = format_trade_message(trade, status="OPEN")
-                            # Modify header and inject diff
-                            final_msg = base_msg.replace("🟢 **OPEN POSITION**", "⚠️ **TRADE UPDATE** ⚠️")
-                            # Inject diff into collateral line
-                            # We know the line format is "**Collateral:** X,XXX.XX USDC"
-                            # We can just append it to the message for simplicity or replace
-                            final_msg += f"\n**Change:** {diff_str}"
-                            
-                            await broadcast_message(application, final_msg)
-                            known_trades[uid] = trade # Update known state
-
-                # Check for CLOSED trades
-                closed_uids = []
-                used_history_ids = set() # Track matched history items to avoid duplicates
-                
-                # Fetch history once if there are closed trades
-                history = []
-                closed_trades_list = [t for uid, t in known_trades.items() if uid not in current_trades]
-                
-                if closed_trades_list:
-                    try:
-                        # Fetch recent history
-                        # Increase last_n_orders to ensure we catch multiple simultaneous closes
-                        history = await sdk.subgraph.get_recent_history(TARGET_WALLET, last_n_orders=20)
-                    except Exception as e:
-                        logger.error(f"Failed to fetch history for closed trades: {e}")
+                known_trades = current_trades
 
-                for uid, trade in known_trades.items():
-                    if uid not in current_trades:
-                        # Trade is CLOSED
-                        logger.info(f"Trade {uid} closed. finding details...")
-                        
-                        close_details = None
-                        
-                        if history:
-                            trade_pair_id = trade.get('pair', {}).get('id')
-                            trade_collateral = float(trade.get('collateral', 0))
-                            
-                            best_match = None
-                            min_diff = float('inf')
-                            
-                            for item in history:
-                                # Skip if already matched to another trade in this batch
-                                if item.get('id') in used_history_ids:
-                                    continue
-                                    
-                                if (item.get('pair', {}).get('id') == trade_pair_id and 
-                                    item.get('orderAction') == 'Close'):
-                                    
-                                    # Match by Collateral (within 1 USDC tolerance)
-                                    # 1 USDC = 1,000,000 units
-                                    hist_collateral = float(item.get('collateral', 0))
-                                    diff = abs(hist_collateral - trade_collateral)
-                                    
-                                    if diff < 1000000: 
-                                        if diff < min_diff:
-                                            min_diff = diff
-                                            best_match = item
-                            
-                            if best_match:
-                                close_details = best_match
-                                used_history_ids.add(best_match.get('id'))
-
-                        # Format message with optional details
-                        msg = format_trade_message(trade, status="CLOSED", close_details=close_details)
-                        await broadcast_message(application, msg)
-                        closed_uids.append(uid)
-                
-                for uid in closed_uids:
-                    del known_trades[uid]
+            # Poll faster while the wallet is active, back off while it is idle.
+            # A trade awaiting close confirmation counts as activity, so the
+            # confirming poll comes POLL_INTERVAL_ACTIVE later, not after a backoff
+            if changed or missing_counts:
+                idle_cycles = 0
+                interval = POLL_INTERVAL_ACTIVE
+            else:
+                idle_cycles += 1
+                interval = min(
+                    POLL_INTERVAL_ACTIVE * 2 ** min(idle_cycles, POLL_IDLE_DOUBLINGS),
+                    POLL_INTERVAL_MAX
+                )
 
         except Exception as e:
-            logger.error(f"Error during polling: {e}")
-        
-        await asyncio.sleep(60)
+            logger.error("Error during polling: %s", e)
+
+        elapsed = monotonic() - cycle_start
+        if elapsed > interval:
+            logger.warning("Poll cycle took %.1fs, longer than the %.0fs interval", elapsed, interval)
+        await asyncio.sleep(max(0.0, interval - elapsed))
 
 async def main():
     """Start the bot."""
+    await init_subscribers_db()
+    logger.info("Loaded %d subscribers from %s", len(subscribers), SUBSCRIBERS_DB)
+
     # Create custom HTTPXRequest with increased timeouts
     # Default timeout is often 5-10 seconds, we increase to 60 seconds
     http_request = HTTPXRequest(
-        connection_pool_size=8,
+        connection_pool_size=TELEGRAM_POOL_SIZE,  # Broadcasts fan out to all subscribers concurrently
         connect_timeout=30.0,  # 30 seconds for connection establishment
         read_timeout=60.0,      # 60 seconds for reading response
         write_timeout=30.0,     # 30 seconds for writing request
@@ -675,6 +1199,22 @@ async def main():
     # Create the Application with custom request object
     application = Application.builder().token(TELEGRAM_BOT_TOKEN).request(http_request).build()
 
+    # Build the SDK once and share it with every handler and background task,
+    # so the subgraph client is not re-created on each command or cycle
+    try:
+        sdk = build_sdk()
+        logger.info("SDK Initialized with Ormi subgraph: %s", sdk.network_config.graph_url)
+    except Exception as e:
+        logger.error("Error initializing SDK: %s", e)
+        raise
+    application.bot_data['sdk'] = sdk
+    # Reuse one pooled HTTP session for every subgraph query
+    application.bot_data['http_transport'] = attach_persistent_transport(sdk)
+    # Caps concurrent broadcast sends (see BROADCAST_CONCURRENCY)
+    application.bot_data['send_sem'] = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    # Broadcasts are queued here and delivered by telegram_worker
+    application.bot_data['msg_queue'] = asyncio.Queue(maxsize=TELEGRAM_QUEUE_SIZE)
+
     # Add handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("stop", stop))
@@ -684,7 +1224,7 @@ async def main():
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            logger.info(f"Initializing Telegram bot (attempt {attempt + 1}/{max_retries})...")
+            logger.info("Initializing Telegram bot (attempt %d/%d)...", attempt + 1, max_retries)
             await application.initialize()
             await application.start()
             logger.info("✅ Telegram bot initialized successfully!")
@@ -692,34 +1232,41 @@ async def main():
         except Exception as e:
             if attempt < max_retries - 1:
                 wait_time = 5 * (attempt + 1)  # 5s, 10s, 15s
-                logger.warning(f"Failed to initialize bot: {type(e).__name__}: {e}")
-                logger.info(f"Retrying in {wait_time} seconds...")
+                logger.warning("Failed to initialize bot: %s: %s", type(e).__name__, e)
+                logger.info("Retrying in %d seconds...", wait_time)
                 await asyncio.sleep(wait_time)
             else:
-                logger.error(f"Failed to initialize bot after {max_retries} attempts. Exiting.")
+                logger.error("Failed to initialize bot after %d attempts. Exiting.", max_retries)
                 raise
     
     await application.updater.start_polling()
 
     # Run background tasks
-    polling_task = asyncio.create_task(poll_ostium(application))
-    daily_report_task = asyncio.create_task(daily_report_scheduler(application))
+    telegram_task = asyncio.create_task(telegram_worker(application))
+    polling_task = asyncio.create_task(poll_ostium(application, sdk))
+    daily_report_task = asyncio.create_task(daily_report_scheduler(application, sdk))
 
     logger.info("All background tasks started successfully!")
 
     # Keep the main loop running
     try:
         # Wait for all tasks (which run forever)
-        await asyncio.gather(polling_task, daily_report_task)
+        await asyncio.gather(telegram_task, polling_task, daily_report_task)
     except asyncio.CancelledError:
         logger.info("Stopping bot...")
     finally:
         await application.updater.stop()
         await application.stop()
         await application.shutdown()
+        await application.bot_data['http_transport'].shutdown()
+        await _subs_db.close()
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if uvloop is not None:
+            # libuv-based loop: cheaper socket I/O for the subgraph and Telegram calls
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         pass